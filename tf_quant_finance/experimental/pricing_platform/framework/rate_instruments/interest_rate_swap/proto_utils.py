@@ -13,11 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Utilities for creating a swap instrument."""
-import hashlib
-import json
+import collections
+import dataclasses
+import functools
 
 from typing import Any, Dict, List, Tuple, Union
 
+import numpy as np
+
 from tf_quant_finance import datetime as dateslib
 from tf_quant_finance.experimental.pricing_platform.framework.core import business_days
 from tf_quant_finance.experimental.pricing_platform.framework.core import currencies
@@ -27,102 +30,210 @@ from tf_quant_finance.experimental.pricing_platform.framework.market_data import
 from tf_quant_finance.experimental.pricing_platform.framework.rate_instruments import coupon_specs
 from tf_quant_finance.experimental.pricing_platform.framework.rate_instruments import utils as instrument_utils
 from tf_quant_finance.experimental.pricing_platform.instrument_protos import interest_rate_swap_pb2 as ir_swap
+from tf_quant_finance.experimental.pricing_platform.instrument_protos import period_pb2
+from tf_quant_finance.experimental.pricing_platform.instrument_protos import rate_indices_pb2
+
+# Maps a proto period type to the canonical `(period type, multiplier)` pair
+# used for batching; YEAR frequencies are expressed in MONTH units. Built once
+# at import time so that the hot paths pay a single dict lookup instead of a
+# function call. Lookups use `.get(t, (t, 1))` so that unrecognized enum
+# values, which proto3 preserves when parsing newer schemas, pass through
+# unchanged.
+_FREQ_REMAP = {period_type: (period_type, 1)
+               for period_type in period_pb2.PeriodType.values()}
+_FREQ_REMAP[period_pb2.PeriodType.YEAR] = (period_pb2.PeriodType.MONTH, 1)
+
+
+@functools.lru_cache(maxsize=128)
+def _cached_rate_index(index_type: int,
+                       index_name: int,
+                       source: str) -> rate_indices.RateIndex:
+  """Builds a `RateIndex` from proto field values, memoized per combination."""
+  proto = rate_indices_pb2.RateIndex(
+      type=index_type, name=index_name, source=source)
+  return rate_indices.RateIndex.from_proto(proto)
+
+
+def _leg_kind(leg_proto: ir_swap.SwapLeg) -> Tuple[bool, Any]:
+  """Resolves the `type` oneof of a swap leg with a single field lookup."""
+  is_fixed = leg_proto.WhichOneof("type") == "fixed_leg"
+  if is_fixed:
+    return is_fixed, leg_proto.fixed_leg
+  return is_fixed, leg_proto.floating_leg
+
+
+def _fixed_leg_spec(leg: ir_swap.FixedLeg) -> coupon_specs.FixedCouponSpecs:
+  """Initializes fixed coupon specifications from a proto instance."""
+  return coupon_specs.FixedCouponSpecs(
+      currency=currencies.from_proto_value(leg.currency),
+      coupon_frequency=leg.coupon_frequency,
+      notional_amount=[instrument_utils.decimal_to_double(
+          leg.notional_amount)],
+      fixed_rate=[instrument_utils.decimal_to_double(
+          leg.fixed_rate)],
+      settlement_days=[leg.settlement_days],
+      businessday_rule=business_days.convention_from_proto_value(
+          leg.business_day_convention),
+      daycount_convention=daycount_conventions.from_proto_value(
+          leg.daycount_convention),
+      calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
+
+
+def _floating_leg_spec(
+    leg: ir_swap.FloatingLeg) -> coupon_specs.FloatCouponSpecs:
+  """Initializes floating coupon specifications from a proto instance."""
+  # Get the index rate object. Distinct index combinations in a batch are few,
+  # so the factory is memoized; copy before the list-wrapping mutation since
+  # the cached instance is shared.
+  index_proto = leg.floating_rate_type
+  rate_index = dataclasses.replace(_cached_rate_index(
+      index_proto.type, index_proto.name, index_proto.source))
+  rate_index.name = [rate_index.name]
+  rate_index.source = [rate_index.source]
+  return coupon_specs.FloatCouponSpecs(
+      currency=currencies.from_proto_value(leg.currency),
+      coupon_frequency=leg.coupon_frequency,
+      reset_frequency=leg.reset_frequency,
+      notional_amount=[instrument_utils.decimal_to_double(
+          leg.notional_amount)],
+      floating_rate_type=rate_index,
+      settlement_days=[leg.settlement_days],
+      businessday_rule=business_days.convention_from_proto_value(
+          leg.business_day_convention),
+      daycount_convention=daycount_conventions.from_proto_value(
+          leg.daycount_convention),
+      spread=[instrument_utils.decimal_to_double(leg.spread)],
+      calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
 
 
 def leg_from_proto(
     leg_proto: ir_swap.SwapLeg) -> Union[coupon_specs.FixedCouponSpecs,
                                          coupon_specs.FloatCouponSpecs]:
   """Initialized coupon specifications from a proto instance."""
-  if leg_proto.HasField("fixed_leg"):
-    leg = leg_proto.fixed_leg
-    return coupon_specs.FixedCouponSpecs(
-        currency=currencies.from_proto_value(leg.currency),
-        coupon_frequency=leg.coupon_frequency,
-        notional_amount=[instrument_utils.decimal_to_double(
-            leg.notional_amount)],
-        fixed_rate=[instrument_utils.decimal_to_double(
-            leg.fixed_rate)],
-        settlement_days=[leg.settlement_days],
-        businessday_rule=business_days.convention_from_proto_value(
-            leg.business_day_convention),
-        daycount_convention=daycount_conventions.from_proto_value(
-            leg.daycount_convention),
-        calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
-  else:
-    leg = leg_proto.floating_leg
-    # Get the index rate object
-    rate_index = leg.floating_rate_type
-    rate_index = rate_indices.RateIndex.from_proto(rate_index)
-    rate_index.name = [rate_index.name]
-    rate_index.source = [rate_index.source]
-    return coupon_specs.FloatCouponSpecs(
-        currency=currencies.from_proto_value(leg.currency),
-        coupon_frequency=leg.coupon_frequency,
-        reset_frequency=leg.reset_frequency,
-        notional_amount=[instrument_utils.decimal_to_double(
-            leg.notional_amount)],
-        floating_rate_type=rate_index,
-        settlement_days=[leg.settlement_days],
-        businessday_rule=business_days.convention_from_proto_value(
-            leg.business_day_convention),
-        daycount_convention=daycount_conventions.from_proto_value(
-            leg.daycount_convention),
-        spread=[instrument_utils.decimal_to_double(leg.spread)],
-        calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
+  is_fixed, leg = _leg_kind(leg_proto)
+  if is_fixed:
+    return _fixed_leg_spec(leg)
+  return _floating_leg_spec(leg)
+
+
+def _fixed_leg_spec_v2(leg: ir_swap.FixedLeg) -> coupon_specs.FixedCouponSpecs:
+  """Initializes fixed coupon specifications from a proto instance."""
+  coupon_frequency = leg.coupon_frequency
+  coupon_freq, coupon_freq_multiplier = _FREQ_REMAP.get(
+      coupon_frequency.type, (coupon_frequency.type, 1))
+  return coupon_specs.FixedCouponSpecs(
+      currency=[currencies.from_proto_value(leg.currency)],
+      coupon_frequency=(
+          coupon_freq,
+          [coupon_freq_multiplier * coupon_frequency.amount]),
+      notional_amount=[instrument_utils.decimal_to_double(
+          leg.notional_amount)],
+      fixed_rate=[instrument_utils.decimal_to_double(
+          leg.fixed_rate)],
+      settlement_days=[leg.settlement_days],
+      businessday_rule=business_days.convention_from_proto_value(
+          leg.business_day_convention),
+      daycount_convention=daycount_conventions.from_proto_value(
+          leg.daycount_convention),
+      calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
+
+
+def _floating_leg_spec_v2(
+    leg: ir_swap.FloatingLeg) -> coupon_specs.FloatCouponSpecs:
+  """Initializes floating coupon specifications from a proto instance."""
+  # Get the index rate object. Distinct index combinations in a batch are few,
+  # so the factory is memoized; copy before the list-wrapping mutation since
+  # the cached instance is shared.
+  index_proto = leg.floating_rate_type
+  rate_index = dataclasses.replace(_cached_rate_index(
+      index_proto.type, index_proto.name, index_proto.source))
+  rate_index.name = [rate_index.name]
+  rate_index.source = [rate_index.source]
+  coupon_frequency = leg.coupon_frequency
+  reset_frequency = leg.reset_frequency
+  coupon_freq, coupon_freq_multiplier = _FREQ_REMAP.get(
+      coupon_frequency.type, (coupon_frequency.type, 1))
+  reset_freq, reset_freq_multiplier = _FREQ_REMAP.get(
+      reset_frequency.type, (reset_frequency.type, 1))
+  return coupon_specs.FloatCouponSpecs(
+      currency=[currencies.from_proto_value(leg.currency)],
+      coupon_frequency=(
+          coupon_freq,
+          [coupon_freq_multiplier * coupon_frequency.amount]),
+      reset_frequency=(
+          reset_freq,
+          [reset_freq_multiplier * reset_frequency.amount]),
+      notional_amount=[instrument_utils.decimal_to_double(
+          leg.notional_amount)],
+      floating_rate_type=[rate_index],
+      settlement_days=[leg.settlement_days],
+      businessday_rule=business_days.convention_from_proto_value(
+          leg.business_day_convention),
+      daycount_convention=daycount_conventions.from_proto_value(
+          leg.daycount_convention),
+      spread=[instrument_utils.decimal_to_double(leg.spread)],
+      calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
 
 
 def leg_from_proto_v2(
     leg_proto: ir_swap.SwapLeg) -> Union[coupon_specs.FixedCouponSpecs,
                                          coupon_specs.FloatCouponSpecs]:
   """Initialized coupon specifications from a proto instance."""
-  if leg_proto.HasField("fixed_leg"):
-    leg = leg_proto.fixed_leg
-    coupon_freq = leg.coupon_frequency.type
-    coupon_freq, coupon_freq_multiplier = _frequency_and_multiplier(coupon_freq)
-    return coupon_specs.FixedCouponSpecs(
-        currency=[currencies.from_proto_value(leg.currency)],
-        coupon_frequency=(
-            coupon_freq,
-            [coupon_freq_multiplier * leg.coupon_frequency.amount]),
-        notional_amount=[instrument_utils.decimal_to_double(
-            leg.notional_amount)],
-        fixed_rate=[instrument_utils.decimal_to_double(
-            leg.fixed_rate)],
-        settlement_days=[leg.settlement_days],
-        businessday_rule=business_days.convention_from_proto_value(
-            leg.business_day_convention),
-        daycount_convention=daycount_conventions.from_proto_value(
-            leg.daycount_convention),
-        calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
-  else:
-    leg = leg_proto.floating_leg
-    # Get the index rate object
-    rate_index = leg.floating_rate_type
-    rate_index = rate_indices.RateIndex.from_proto(rate_index)
-    rate_index.name = [rate_index.name]
-    rate_index.source = [rate_index.source]
-    coupon_freq = leg.coupon_frequency.type
-    coupon_freq, coupon_freq_multiplier = _frequency_and_multiplier(coupon_freq)
-    reset_freq = leg.reset_frequency.type
-    reset_freq, reset_freq_multiplier = _frequency_and_multiplier(reset_freq)
-    return coupon_specs.FloatCouponSpecs(
-        currency=[currencies.from_proto_value(leg.currency)],
-        coupon_frequency=(
-            coupon_freq,
-            [coupon_freq_multiplier * leg.coupon_frequency.amount]),
-        reset_frequency=(
-            reset_freq,
-            [reset_freq_multiplier * leg.reset_frequency.amount]),
-        notional_amount=[instrument_utils.decimal_to_double(
-            leg.notional_amount)],
-        floating_rate_type=[rate_index],
-        settlement_days=[leg.settlement_days],
-        businessday_rule=business_days.convention_from_proto_value(
-            leg.business_day_convention),
-        daycount_convention=daycount_conventions.from_proto_value(
-            leg.daycount_convention),
-        spread=[instrument_utils.decimal_to_double(leg.spread)],
-        calendar=business_days.holiday_from_proto_value(leg.bank_holidays))
+  is_fixed, leg = _leg_kind(leg_proto)
+  if is_fixed:
+    return _fixed_leg_spec_v2(leg)
+  return _floating_leg_spec_v2(leg)
+
+
+def _update_fixed_leg(
+    current_leg: coupon_specs.FixedCouponSpecs,
+    leg: coupon_specs.FixedCouponSpecs):
+  """Adds new fixed leg info to the current leg."""
+  current_leg.notional_amount.extend(leg.notional_amount)
+  current_leg.fixed_rate.extend(leg.fixed_rate)
+  current_leg.settlement_days.extend(leg.settlement_days)
+
+
+def _update_float_leg(
+    current_leg: coupon_specs.FloatCouponSpecs,
+    leg: coupon_specs.FloatCouponSpecs):
+  """Adds new floating leg info to the current leg."""
+  current_leg.notional_amount.extend(leg.notional_amount)
+  update_rate_index(current_leg.floating_rate_type, leg.floating_rate_type)
+  current_leg.settlement_days.extend(leg.settlement_days)
+  current_leg.spread.extend(leg.spread)
+
+
+def _update_fixed_leg_v2(
+    current_leg: coupon_specs.FixedCouponSpecs,
+    leg: coupon_specs.FixedCouponSpecs):
+  """Adds new fixed leg info to the current leg."""
+  current_leg.currency.extend(leg.currency)
+  current_leg.notional_amount.extend(leg.notional_amount)
+  current_leg.fixed_rate.extend(leg.fixed_rate)
+  current_leg.settlement_days.extend(leg.settlement_days)
+  current_leg.coupon_frequency[1].extend(leg.coupon_frequency[1])
+
+
+def _update_float_leg_v2(
+    current_leg: coupon_specs.FloatCouponSpecs,
+    leg: coupon_specs.FloatCouponSpecs):
+  """Adds new floating leg info to the current leg."""
+  current_leg.currency.extend(leg.currency)
+  current_leg.notional_amount.extend(leg.notional_amount)
+  current_leg.floating_rate_type.extend(leg.floating_rate_type)
+  current_leg.settlement_days.extend(leg.settlement_days)
+  current_leg.spread.extend(leg.spread)
+  current_leg.coupon_frequency[1].extend(leg.coupon_frequency[1])
+  current_leg.reset_frequency[1].extend(leg.reset_frequency[1])
+
+
+# Dispatch tables for `update_leg*`. Resolving the handler by the spec type
+# avoids the per-call isinstance chain on the hot batching path.
+_UPDATERS = {coupon_specs.FixedCouponSpecs: _update_fixed_leg,
+             coupon_specs.FloatCouponSpecs: _update_float_leg}
+_UPDATERS_V2 = {coupon_specs.FixedCouponSpecs: _update_fixed_leg_v2,
+                coupon_specs.FloatCouponSpecs: _update_float_leg_v2}
 
 
 def update_leg(
@@ -130,21 +241,10 @@ def update_leg(
                        coupon_specs.FloatCouponSpecs],
     leg: Union[coupon_specs.FixedCouponSpecs, coupon_specs.FloatCouponSpecs]):
   """Adds new leg info to the current leg."""
-  if isinstance(current_leg, coupon_specs.FixedCouponSpecs):
-    if not isinstance(leg, coupon_specs.FixedCouponSpecs):
-      raise ValueError("Both `current_leg` and `leg` should beof the same "
-                       "fixed or float type.")
-    current_leg.notional_amount += leg.notional_amount
-    current_leg.fixed_rate += leg.fixed_rate
-    current_leg.settlement_days += leg.settlement_days
-  else:
-    if not isinstance(leg, coupon_specs.FloatCouponSpecs):
-      raise ValueError("Both `current_leg` and `leg` should beof the same "
-                       "fixed or float type.")
-    current_leg.notional_amount += leg.notional_amount
-    update_rate_index(current_leg.floating_rate_type, leg.floating_rate_type)
-    current_leg.settlement_days += leg.settlement_days
-    current_leg.spread += leg.spread
+  if type(current_leg) is not type(leg):
+    raise ValueError("Both `current_leg` and `leg` should beof the same "
+                     "fixed or float type.")
+  _UPDATERS[type(current_leg)](current_leg, leg)
 
 
 def update_leg_v2(
@@ -152,323 +252,356 @@ def update_leg_v2(
                        coupon_specs.FloatCouponSpecs],
     leg: Union[coupon_specs.FixedCouponSpecs, coupon_specs.FloatCouponSpecs]):
   """Adds new leg info to the current leg."""
-  if isinstance(current_leg, coupon_specs.FixedCouponSpecs):
-    if not isinstance(leg, coupon_specs.FixedCouponSpecs):
-      raise ValueError("Both `current_leg` and `leg` should beof the same "
-                       "fixed or float type.")
-    current_leg.currency += leg.currency
-    current_leg.notional_amount += leg.notional_amount
-    current_leg.fixed_rate += leg.fixed_rate
-    current_leg.settlement_days += leg.settlement_days
-    current_leg.coupon_frequency = (
-        current_leg.coupon_frequency[0],
-        current_leg.coupon_frequency[1] + leg.coupon_frequency[1])
-  else:
-    if not isinstance(leg, coupon_specs.FloatCouponSpecs):
-      raise ValueError("Both `current_leg` and `leg` should beof the same "
-                       "fixed or float type.")
-    current_leg.currency += leg.currency
-    current_leg.notional_amount += leg.notional_amount
-    current_leg.floating_rate_type += leg.floating_rate_type
-    current_leg.settlement_days += leg.settlement_days
-    current_leg.spread += leg.spread
-    current_leg.coupon_frequency = (
-        current_leg.coupon_frequency[0],
-        current_leg.coupon_frequency[1] + leg.coupon_frequency[1])
-    current_leg.reset_frequency = (
-        current_leg.reset_frequency[0],
-        current_leg.reset_frequency[1] + leg.reset_frequency[1])
+  if type(current_leg) is not type(leg):
+    raise ValueError("Both `current_leg` and `leg` should beof the same "
+                     "fixed or float type.")
+  _UPDATERS_V2[type(current_leg)](current_leg, leg)
 
 
 def update_rate_index(
     current_index: rate_indices.RateIndex,
     index: rate_indices.RateIndex):
-  """Creates a dictionary of grouped protos."""
+  """Adds new rate index info to the current rate index."""
   if current_index.type != index.type:
     raise ValueError(f"Can not join {current_index.type} and {index.type}")
-  current_index.name = current_index.name + index.name
-  current_index.source = current_index.source + index.source
-
-
-def get_hash(swap_proto: ir_swap.InterestRateSwap) -> Tuple[int, bool]:
-  """Computes hash key for the batching strategy."""
+  # Extend in place: rebuilding the lists with `+` copies all previously
+  # accumulated entries, which makes batch building quadratic in group size.
+  current_index.name.extend(index.name)
+  current_index.source.extend(index.source)
+
+
+# Caches of already computed batching keys, so that a `group_protos*` call
+# followed by `from_protos*` on the same protos walks each proto only once.
+# Keyed by `id` of the swap proto with the proto itself kept in the value, so
+# that a recycled `id` of a garbage-collected proto can not alias an entry.
+# Cleared by `from_protos*` once the batch is built.
+_MAX_HASH_CACHE_SIZE = 10000
+_hash_cache: Dict[int, Any] = {}
+_hash_cache_v2: Dict[int, Any] = {}
+
+
+def get_hash(swap_proto: ir_swap.InterestRateSwap) -> Tuple[Any, bool]:
+  """Computes hash key for the batching strategy.
+
+  The key is a plain tuple of proto field values intended for in-process
+  grouping only; it is not a stable cross-process digest.
+  """
+  cached = _hash_cache.get(id(swap_proto))
+  if cached is not None and cached[0] is swap_proto:
+    return cached[1], cached[2]
   pay_leg = swap_proto.pay_leg
   receive_leg = swap_proto.receive_leg
   flip_legs, key = _get_legs_hash_key(pay_leg, receive_leg)
   currency = swap_proto.currency
   bank_holidays = swap_proto.bank_holidays
-  h = _hasher(tuple(key + [currency] + [bank_holidays]))
+  h = key + (currency, bank_holidays)
+  if len(_hash_cache) >= _MAX_HASH_CACHE_SIZE:
+    _hash_cache.clear()
+  _hash_cache[id(swap_proto)] = (swap_proto, h, flip_legs)
   return h, flip_legs
 
 
-def get_hash_v2(swap_proto: ir_swap.InterestRateSwap) -> Tuple[int, bool]:
-  """Computes hash key for the batching strategy."""
+def get_hash_v2(swap_proto: ir_swap.InterestRateSwap) -> Tuple[Any, bool]:
+  """Computes hash key for the batching strategy.
+
+  The key is a plain tuple of proto field values intended for in-process
+  grouping only; it is not a stable cross-process digest.
+  """
+  cached = _hash_cache_v2.get(id(swap_proto))
+  if cached is not None and cached[0] is swap_proto:
+    return cached[1], cached[2]
   pay_leg = swap_proto.pay_leg
   receive_leg = swap_proto.receive_leg
   flip_legs, key = _get_legs_hash_key_v2(pay_leg, receive_leg)
   bank_holidays = swap_proto.bank_holidays
-  h = _hasher(tuple(key + [bank_holidays]))
+  h = key + (bank_holidays,)
+  if len(_hash_cache_v2) >= _MAX_HASH_CACHE_SIZE:
+    _hash_cache_v2.clear()
+  _hash_cache_v2[id(swap_proto)] = (swap_proto, h, flip_legs)
   return h, flip_legs
 
 
+def _group_protos(
+    proto_list: List[ir_swap.InterestRateSwap],
+    hash_fn) -> Dict[Any, Any]:
+  """Groups the protos by the batching key computed with `hash_fn`."""
+  grouped_swaps = collections.defaultdict(list)
+  for swap_proto in proto_list:
+    h, _ = hash_fn(swap_proto)
+    grouped_swaps[h].append(swap_proto)
+  return grouped_swaps
+
+
 def group_protos(
     proto_list: List[ir_swap.InterestRateSwap],
     swap_config: "InterestRateSwapConfig" = None
-    ) -> Dict[str, Any]:
+    ) -> Dict[Any, Any]:
   """Creates a dictionary of grouped protos."""
   del swap_config  # swap_config does not impact the batching
-  grouped_swaps = {}
-  for swap_proto in proto_list:
-    h, _ = get_hash(swap_proto)
-    if h in grouped_swaps:
-      grouped_swaps[h].append(swap_proto)
-    else:
-      grouped_swaps[h] = [swap_proto]
-  return grouped_swaps
+  return _group_protos(proto_list, get_hash)
 
 
 def group_protos_v2(
     proto_list: List[ir_swap.InterestRateSwap],
     swap_config: "InterestRateSwapConfig" = None
-    ) -> Dict[str, Any]:
+    ) -> Dict[Any, Any]:
   """Creates a dictionary of grouped protos."""
   del swap_config  # swap_config does not impact the batching
-  grouped_swaps = {}
-  for swap_proto in proto_list:
-    h, _ = get_hash_v2(swap_proto)
-    if h in grouped_swaps:
-      grouped_swaps[h].append(swap_proto)
-    else:
-      grouped_swaps[h] = [swap_proto]
-  return grouped_swaps
+  return _group_protos(proto_list, get_hash_v2)
 
 
-def from_protos(
+@dataclasses.dataclass
+class _BatchGroup:
+  """Mutable per-group accumulator used while batching swaps.
+
+  Attribute access on a slotted record is considerably cheaper than the
+  string-keyed dict lookups it replaces on the hot merge path; the groups are
+  projected onto the public dict shape only once, on return.
+  """
+  __slots__ = ("pay_leg", "receive_leg", "batch_names")
+  pay_leg: Any
+  receive_leg: Any
+  batch_names: List[Any]
+
+
+def _from_protos(
     proto_list: List[ir_swap.InterestRateSwap],
-    swap_config: "InterestRateSwapConfig" = None
-    ) -> Dict[str, Any]:
-  """Creates a dictionary of preprocessed swap data."""
+    swap_config: "InterestRateSwapConfig",
+    hash_cache: Dict[int, Any],
+    legs_hash_key_fn,
+    fixed_spec_fn,
+    float_spec_fn,
+    update_leg_fn,
+    include_currency: bool) -> Dict[Any, Any]:
+  """Single-pass batching implementation shared by `from_protos*`.
+
+  The v1 and v2 pipelines differ only in the key/spec/update helpers and in
+  whether the swap currency is part of the batching key; everything else -
+  the oneof resolution, the hash-cache reuse, the NumPy date/notional
+  buffers - is version independent.
+  """
+  # Per-swap dates and notionals are collected into preallocated NumPy
+  # buffers and distributed to the groups after the loop, so that the date
+  # extraction and the notional sign flips run as bulk C-level operations
+  # instead of per-swap Python list arithmetic.
+  num_swaps = len(proto_list)
+  start_dates = np.empty((num_swaps, 3), dtype=np.int32)
+  maturity_dates = np.empty((num_swaps, 3), dtype=np.int32)
+  pay_notionals = np.empty(num_swaps, dtype=np.float64)
+  receive_notionals = np.empty(num_swaps, dtype=np.float64)
+  flip_mask = np.zeros(num_swaps, dtype=bool)
+  group_rows = {}
   prepare_swaps = {}
-  for swap_proto in proto_list:
-    pay_leg = swap_proto.pay_leg
-    receive_leg = swap_proto.receive_leg
-    h, flip_legs = get_hash(swap_proto)
-    start_date = swap_proto.effective_date
-    start_date = [start_date.year,
-                  start_date.month,
-                  start_date.day]
+  for i, swap_proto in enumerate(proto_list):
+    # Resolve the leg oneofs once and reuse the result for both the batching
+    # key and the coupon spec construction, so that each proto is walked in a
+    # single pass.
+    pay_is_fixed, pay_sub_leg = _leg_kind(swap_proto.pay_leg)
+    receive_is_fixed, receive_sub_leg = _leg_kind(swap_proto.receive_leg)
+    cached = hash_cache.get(id(swap_proto))
+    if cached is not None and cached[0] is swap_proto:
+      h, flip_legs = cached[1], cached[2]
+    else:
+      flip_legs, key = legs_hash_key_fn(
+          pay_is_fixed, pay_sub_leg, receive_is_fixed, receive_sub_leg)
+      if include_currency:
+        h = key + (swap_proto.currency, swap_proto.bank_holidays)
+      else:
+        h = key + (swap_proto.bank_holidays,)
+    effective_date = swap_proto.effective_date
+    start_dates[i] = (effective_date.year,
+                      effective_date.month,
+                      effective_date.day)
     maturity_date = swap_proto.maturity_date
-    maturity_date = [maturity_date.year,
-                     maturity_date.month,
-                     maturity_date.day]
-    pay_leg_shuffled = leg_from_proto(pay_leg)
-    receive_leg_shuffled = leg_from_proto(receive_leg)
+    maturity_dates[i] = (maturity_date.year,
+                         maturity_date.month,
+                         maturity_date.day)
+    pay_leg_shuffled = (fixed_spec_fn(pay_sub_leg) if pay_is_fixed
+                        else float_spec_fn(pay_sub_leg))
+    receive_leg_shuffled = (fixed_spec_fn(receive_sub_leg)
+                            if receive_is_fixed
+                            else float_spec_fn(receive_sub_leg))
     if flip_legs:
-      notional_amount = receive_leg_shuffled.notional_amount
-      receive_leg_shuffled.notional_amount = [-el for el in notional_amount]
-      notional_amount = pay_leg_shuffled.notional_amount
-      pay_leg_shuffled.notional_amount = [-el for el in notional_amount]
+      flip_mask[i] = True
       pay_leg = receive_leg_shuffled
       receive_leg = pay_leg_shuffled
     else:
       pay_leg = pay_leg_shuffled
       receive_leg = receive_leg_shuffled
-    name = swap_proto.metadata.id
-    instrument_type = swap_proto.metadata.instrument_type
-    if h in prepare_swaps:
-      current_pay_leg = prepare_swaps[h]["pay_leg"]
-      current_receive_leg = prepare_swaps[h]["receive_leg"]
-      update_leg(current_pay_leg, pay_leg)
-      update_leg(current_receive_leg, receive_leg)
-      prepare_swaps[h]["start_date"].append(start_date)
-      prepare_swaps[h]["maturity_date"].append(maturity_date)
-      prepare_swaps[h]["batch_names"].append([name, instrument_type])
+    pay_notionals[i] = pay_leg.notional_amount[0]
+    receive_notionals[i] = receive_leg.notional_amount[0]
+    metadata = swap_proto.metadata
+    name = metadata.id
+    instrument_type = metadata.instrument_type
+    entry = prepare_swaps.get(h)
+    if entry is not None:
+      update_leg_fn(entry.pay_leg, pay_leg)
+      update_leg_fn(entry.receive_leg, receive_leg)
+      entry.batch_names.append([name, instrument_type])
+      group_rows[h].append(i)
     else:
-      prepare_swaps[h] = {"start_date": [start_date],
-                          "maturity_date": [maturity_date],
-                          "pay_leg": pay_leg,
-                          "receive_leg": receive_leg,
-                          "swap_config": swap_config,
-                          "batch_names": [[name, instrument_type]]}
-  return prepare_swaps
+      prepare_swaps[h] = _BatchGroup(
+          pay_leg=pay_leg,
+          receive_leg=receive_leg,
+          batch_names=[[name, instrument_type]])
+      group_rows[h] = [i]
+  # Flipped swaps pay the original receive leg, so both notionals change sign.
+  np.negative(pay_notionals, where=flip_mask, out=pay_notionals)
+  np.negative(receive_notionals, where=flip_mask, out=receive_notionals)
+  result = {}
+  for h, entry in prepare_swaps.items():
+    rows = group_rows[h]
+    pay_leg = entry.pay_leg
+    receive_leg = entry.receive_leg
+    pay_leg.notional_amount = pay_notionals[rows].tolist()
+    receive_leg.notional_amount = receive_notionals[rows].tolist()
+    group = {"start_date": start_dates[rows].tolist(),
+             "maturity_date": maturity_dates[rows].tolist(),
+             "pay_leg": pay_leg,
+             "receive_leg": receive_leg,
+             "batch_names": entry.batch_names}
+    if swap_config is not None:
+      # Omitted when `None`: the instrument initializers expanding these
+      # entries as keyword arguments default `swap_config` to `None` anyway.
+      group["swap_config"] = swap_config
+    result[h] = group
+  hash_cache.clear()
+  return result
+
+
+def from_protos(
+    proto_list: List[ir_swap.InterestRateSwap],
+    swap_config: "InterestRateSwapConfig" = None
+    ) -> Dict[Any, Any]:
+  """Creates a dictionary of preprocessed swap data."""
+  return _from_protos(
+      proto_list, swap_config, _hash_cache, _legs_hash_key,
+      _fixed_leg_spec, _floating_leg_spec, update_leg,
+      include_currency=True)
 
 
 def from_protos_v2(
     proto_list: List[ir_swap.InterestRateSwap],
     swap_config: "InterestRateSwapConfig" = None
-    ) -> Dict[str, Any]:
+    ) -> Dict[Any, Any]:
   """Creates a dictionary of preprocessed swap data."""
-  prepare_swaps = {}
-  for swap_proto in proto_list:
-    pay_leg = swap_proto.pay_leg
-    receive_leg = swap_proto.receive_leg
-    h, flip_legs = get_hash_v2(swap_proto)
-    start_date = swap_proto.effective_date
-    start_date = [start_date.year,
-                  start_date.month,
-                  start_date.day]
-    maturity_date = swap_proto.maturity_date
-    maturity_date = [maturity_date.year,
-                     maturity_date.month,
-                     maturity_date.day]
-    pay_leg_shuffled = leg_from_proto_v2(pay_leg)
-    receive_leg_shuffled = leg_from_proto_v2(receive_leg)
-    if flip_legs:
-      notional_amount = receive_leg_shuffled.notional_amount
-      receive_leg_shuffled.notional_amount = [-el for el in notional_amount]
-      notional_amount = pay_leg_shuffled.notional_amount
-      pay_leg_shuffled.notional_amount = [-el for el in notional_amount]
-      pay_leg = receive_leg_shuffled
-      receive_leg = pay_leg_shuffled
-    else:
-      pay_leg = pay_leg_shuffled
-      receive_leg = receive_leg_shuffled
-    name = swap_proto.metadata.id
-    instrument_type = swap_proto.metadata.instrument_type
-    if h in prepare_swaps:
-      current_pay_leg = prepare_swaps[h]["pay_leg"]
-      current_receive_leg = prepare_swaps[h]["receive_leg"]
-      update_leg_v2(current_pay_leg, pay_leg)
-      update_leg_v2(current_receive_leg, receive_leg)
-      prepare_swaps[h]["start_date"].append(start_date)
-      prepare_swaps[h]["maturity_date"].append(maturity_date)
-      prepare_swaps[h]["batch_names"].append([name, instrument_type])
-    else:
-      prepare_swaps[h] = {"start_date": [start_date],
-                          "maturity_date": [maturity_date],
-                          "pay_leg": pay_leg,
-                          "receive_leg": receive_leg,
-                          "swap_config": swap_config,
-                          "batch_names": [[name, instrument_type]]}
-  return prepare_swaps
+  return _from_protos(
+      proto_list, swap_config, _hash_cache_v2, _legs_hash_key_v2,
+      _fixed_leg_spec_v2, _floating_leg_spec_v2, update_leg_v2,
+      include_currency=False)
 
 
 def update_frequency(leg: Tuple[int, List[int]]) -> dateslib.PeriodTensor:
   """Updates frequencies of a leg to an instance of PeriodTensor."""
   leg.coupon_frequency = market_data_utils.period_from_list(
       leg.coupon_frequency)
-  try:
+  if isinstance(leg, coupon_specs.FloatCouponSpecs):
     leg.reset_frequency = market_data_utils.period_from_list(
         leg.reset_frequency)
-  except AttributeError:
-    pass
 
 
-def _fixed_leg_key(leg: ir_swap.FixedLeg) -> List[Any]:
-  return [leg.coupon_frequency.type, leg.coupon_frequency.amount,
-          leg.daycount_convention, leg.business_day_convention]
+# Leg-kind tags used as the leading element of the per-leg batching keys.
+# Tagging the kind keeps the keys compact (no `None` padding) and makes it
+# impossible for a fixed and a floating leg to produce colliding keys.
+_FIXED_LEG_TAG = 0
+_FLOATING_LEG_TAG = 1
 
 
-def _floating_leg_key(leg: ir_swap.FloatingLeg) -> List[Any]:
-  rate_index = leg.floating_rate_type
-  return [leg.coupon_frequency.type, leg.coupon_frequency.amount,
-          leg.reset_frequency.type, leg.reset_frequency.amount,
-          leg.daycount_convention, leg.business_day_convention, rate_index.type]
+def _fixed_leg_key(leg: ir_swap.FixedLeg) -> Tuple[Any, ...]:
+  coupon_frequency = leg.coupon_frequency
+  return (_FIXED_LEG_TAG,
+          coupon_frequency.type, coupon_frequency.amount,
+          leg.daycount_convention, leg.business_day_convention)
 
 
-def _get_keys(leg: ir_swap.SwapLeg) -> Tuple[List[Any], List[Any]]:
-  """Computes key values for a function that partitions swaps into batches."""
-  if leg.HasField("fixed_leg"):
-    fixed_leg = leg.fixed_leg
-    key_1 = _fixed_leg_key(fixed_leg)
-    key_2 = 7 * [None]
-  else:
-    floating_leg = leg.floating_leg
-    key_1 = 4 * [None]
-    key_2 = _floating_leg_key(floating_leg)
-  # len(key_1) + len(key_2) = 11 - this is the number of features involved into
-  # the batching procedure
-  return key_1, key_2
+def _floating_leg_key(leg: ir_swap.FloatingLeg) -> Tuple[Any, ...]:
+  coupon_frequency = leg.coupon_frequency
+  reset_frequency = leg.reset_frequency
+  return (_FLOATING_LEG_TAG,
+          coupon_frequency.type, coupon_frequency.amount,
+          reset_frequency.type, reset_frequency.amount,
+          leg.daycount_convention, leg.business_day_convention,
+          leg.floating_rate_type.type)
 
 
-def _get_legs_hash_key(
-    leg_1: ir_swap.SwapLeg,
-    leg_2: ir_swap.SwapLeg) -> Tuple[bool, List[Any]]:
-  """Computes hash keys for the legs in order to perform batching."""
+def _legs_hash_key(
+    pay_is_fixed: bool,
+    pay_sub_leg: Union[ir_swap.FixedLeg, ir_swap.FloatingLeg],
+    receive_is_fixed: bool,
+    receive_sub_leg: Union[ir_swap.FixedLeg, ir_swap.FloatingLeg]
+    ) -> Tuple[bool, Tuple[Any, ...]]:
+  """Computes hash keys for the resolved legs in order to perform batching."""
   # Batching is performed on start_date, end_date, float_rate_type (if it is
   # associated with the same CurveType), fixed_rate, notional amount,
   # settlement days, and basis points.
-  pay_leg_key_1, pay_leg_key_2 = _get_keys(leg_1)
-  receive_leg_key_1, receive_leg_key_2 = _get_keys(leg_2)
-  key_1 = pay_leg_key_1 + pay_leg_key_2
-  key_2 = receive_leg_key_1 + receive_leg_key_2
-  flip_legs = False
+  pay_key = (_fixed_leg_key(pay_sub_leg) if pay_is_fixed
+             else _floating_leg_key(pay_sub_leg))
+  receive_key = (_fixed_leg_key(receive_sub_leg) if receive_is_fixed
+                 else _floating_leg_key(receive_sub_leg))
   # If this is a vanilla swap, keep pay_leg fixed and receive_leg float
-  if (pay_leg_key_1[0] is None
-      and receive_leg_key_1[0] is not None):
-    flip_legs = True
+  flip_legs = not pay_is_fixed and receive_is_fixed
   if flip_legs:
-    return flip_legs, key_2 + key_1
+    return flip_legs, receive_key + pay_key
   else:
-    return flip_legs, key_1 + key_2
+    return flip_legs, pay_key + receive_key
 
 
-def _fixed_leg_key_v2(leg: ir_swap.FixedLeg) -> List[Any]:
-  coupon_freq_type = leg.coupon_frequency.type
-  if coupon_freq_type == 5:
-    coupon_freq_type = 3
-  return [coupon_freq_type,
-          leg.daycount_convention, leg.business_day_convention]
-
-
-def _floating_leg_key_v2(leg: ir_swap.FloatingLeg) -> List[Any]:
-  coupon_freq_type = leg.coupon_frequency.type
-  coupon_freq_type, _ = _frequency_and_multiplier(coupon_freq_type)
-  reset_freq_type = leg.reset_frequency.type
-  reset_freq_type, _ = _frequency_and_multiplier(reset_freq_type)
-  return [coupon_freq_type,
+def _get_legs_hash_key(
+    leg_1: ir_swap.SwapLeg,
+    leg_2: ir_swap.SwapLeg) -> Tuple[bool, Tuple[Any, ...]]:
+  """Computes hash keys for the legs in order to perform batching."""
+  pay_is_fixed, pay_sub_leg = _leg_kind(leg_1)
+  receive_is_fixed, receive_sub_leg = _leg_kind(leg_2)
+  return _legs_hash_key(
+      pay_is_fixed, pay_sub_leg, receive_is_fixed, receive_sub_leg)
+
+
+def _fixed_leg_key_v2(leg: ir_swap.FixedLeg) -> Tuple[Any, ...]:
+  coupon_freq_type, _ = _FREQ_REMAP.get(
+      leg.coupon_frequency.type, (leg.coupon_frequency.type, 1))
+  return (_FIXED_LEG_TAG,
+          coupon_freq_type,
+          leg.daycount_convention, leg.business_day_convention)
+
+
+def _floating_leg_key_v2(leg: ir_swap.FloatingLeg) -> Tuple[Any, ...]:
+  coupon_freq_type, _ = _FREQ_REMAP.get(
+      leg.coupon_frequency.type, (leg.coupon_frequency.type, 1))
+  reset_freq_type, _ = _FREQ_REMAP.get(
+      leg.reset_frequency.type, (leg.reset_frequency.type, 1))
+  return (_FLOATING_LEG_TAG,
+          coupon_freq_type,
           reset_freq_type,
-          leg.daycount_convention, leg.business_day_convention]
-
-
-def _get_keys_v2(leg: ir_swap.SwapLeg) -> Tuple[List[Any], List[Any]]:
-  """Computes key values for a function that partitions swaps into batches."""
-  if leg.HasField("fixed_leg"):
-    fixed_leg = leg.fixed_leg
-    key_1 = _fixed_leg_key_v2(fixed_leg)
-    key_2 = 4 * [None]
-  else:
-    floating_leg = leg.floating_leg
-    key_1 = 3 * [None]
-    key_2 = _floating_leg_key_v2(floating_leg)
-  # len(key_1) + len(key_2) = 7 - this is the number of features involved into
-  # the batching procedure
-  return key_1, key_2
+          leg.daycount_convention, leg.business_day_convention)
 
 
-def _get_legs_hash_key_v2(
-    leg_1: ir_swap.SwapLeg,
-    leg_2: ir_swap.SwapLeg) -> Tuple[bool, List[Any]]:
-  """Computes hash keys for the legs in order to perform batching."""
+def _legs_hash_key_v2(
+    pay_is_fixed: bool,
+    pay_sub_leg: Union[ir_swap.FixedLeg, ir_swap.FloatingLeg],
+    receive_is_fixed: bool,
+    receive_sub_leg: Union[ir_swap.FixedLeg, ir_swap.FloatingLeg]
+    ) -> Tuple[bool, Tuple[Any, ...]]:
+  """Computes hash keys for the resolved legs in order to perform batching."""
   # Batching is performed on start_date, end_date, float_rate_type (if it is
   # associated with the same CurveType), fixed_rate, notional amount,
   # settlement days, and basis points.
-  pay_leg_key_1, pay_leg_key_2 = _get_keys_v2(leg_1)
-  receive_leg_key_1, receive_leg_key_2 = _get_keys_v2(leg_2)
-  key_1 = pay_leg_key_1 + pay_leg_key_2
-  key_2 = receive_leg_key_1 + receive_leg_key_2
-  flip_legs = False
+  pay_key = (_fixed_leg_key_v2(pay_sub_leg) if pay_is_fixed
+             else _floating_leg_key_v2(pay_sub_leg))
+  receive_key = (_fixed_leg_key_v2(receive_sub_leg) if receive_is_fixed
+                 else _floating_leg_key_v2(receive_sub_leg))
   # If this is a vanilla swap, keep pay_leg fixed and receive_leg float
-  if (pay_leg_key_1[0] is None
-      and receive_leg_key_1[0] is not None):
-    flip_legs = True
+  flip_legs = not pay_is_fixed and receive_is_fixed
   if flip_legs:
-    return flip_legs, key_2 + key_1
+    return flip_legs, receive_key + pay_key
   else:
-    return flip_legs, key_1 + key_2
-
+    return flip_legs, pay_key + receive_key
 
-def _frequency_and_multiplier(freq_type):
-  """Converts frequency type to MONTH and returns the computes multiplier."""
-  multiplier = 1
-  if freq_type == 5:
-    freq_type = 3
-  return freq_type, multiplier
 
-
-# TODO(b/168411151): extract the non-cryptographic hasher to the common
-# utilities
-def _hasher(obj):
-  """Computes non-cryptographic hash of an object."""
-  h = hashlib.md5(json.dumps(obj).encode())
-  return h.hexdigest()
+def _get_legs_hash_key_v2(
+    leg_1: ir_swap.SwapLeg,
+    leg_2: ir_swap.SwapLeg) -> Tuple[bool, Tuple[Any, ...]]:
+  """Computes hash keys for the legs in order to perform batching."""
+  pay_is_fixed, pay_sub_leg = _leg_kind(leg_1)
+  receive_is_fixed, receive_sub_leg = _leg_kind(leg_2)
+  return _legs_hash_key_v2(
+      pay_is_fixed, pay_sub_leg, receive_is_fixed, receive_sub_leg)
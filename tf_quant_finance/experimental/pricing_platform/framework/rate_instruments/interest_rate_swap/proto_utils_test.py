@@ -136,6 +136,21 @@ class ProtoUtilsTest(tf.test.TestCase):
       self.assertEqual(type(values["receive_leg"]),
                        rate_instruments.coupon_specs.FloatCouponSpecs)
 
+  def test_from_protos_v2_reuses_group_protos_v2_hashes(self):
+    """Test that the cached grouping pipeline matches the uncached one."""
+    protos = [self._swap_1, self._swap_2, self._swap_1]
+    # `from_protos_v2` clears the hash cache on return, so this call yields
+    # the uncached result.
+    expected = proto_utils.from_protos_v2(protos)
+    proto_utils.group_protos_v2(protos)
+    with self.subTest("CachePopulated"):
+      self.assertNotEmpty(proto_utils._hash_cache_v2)
+    values_dict = proto_utils.from_protos_v2(protos)
+    with self.subTest("SameResult"):
+      self.assertEqual(values_dict, expected)
+    with self.subTest("CacheCleared"):
+      self.assertEmpty(proto_utils._hash_cache_v2)
+
 
 if __name__ == "__main__":
   tf.test.main()